@@ -0,0 +1,4 @@
+import os
+
+# main.py refuses to import without a Telex channel configured
+os.environ.setdefault("TELEX_CHANNEL_ID", "test-channel")
@@ -0,0 +1,15 @@
+import os
+
+# Run with: gunicorn main:app
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# One Uvicorn worker (and event loop) per CPU core; uvicorn.workers is deprecated
+# in favour of the separate uvicorn-worker package
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+# Each worker imports the app and builds its own Telex client in the lifespan,
+# so nothing is shared across processes
+preload_app = False
+
+loglevel = os.getenv("LOG_LEVEL", "warning").lower()
@@ -1,82 +1,474 @@
+import asyncio
+import base64
+import binascii
+import enum
+import hmac
+import logging
+import math
 import os
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, Any
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, ValidationError
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 import httpx
+import orjson
 
 # Load environment variables
 load_dotenv()
 
-# Initialize FastAPI
-app = FastAPI()
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["POST", "OPTIONS"],  
-    allow_headers=["*"],
-)
-
 # Retrieve Telex webhook details
 TELEX_CHANNEL_ID = os.getenv("TELEX_CHANNEL_ID")
 if not TELEX_CHANNEL_ID:
     raise ValueError("TELEX_CHANNEL_ID is not set in environment variables!")
 
-TELEX_WEBHOOK_URL = f"https://ping.telex.im/v1/webhooks/{TELEX_CHANNEL_ID}"
+TELEX_BASE_URL = "https://ping.telex.im"
+TELEX_WEBHOOK_PATH = f"/v1/webhooks/{TELEX_CHANNEL_ID}"
+
+# Optional Zendesk webhook signing secret; signatures are only checked when it is set
+ZENDESK_WEBHOOK_SECRET = os.getenv("ZENDESK_WEBHOOK_SECRET")
+_ZENDESK_SECRET_BYTES = ZENDESK_WEBHOOK_SECRET.encode() if ZENDESK_WEBHOOK_SECRET else None
+
+# The Telex payload schema is fixed, so encode the static fields once and
+# only JSON-encode the message per request
+TELEX_PAYLOAD_PREFIX = orjson.dumps({
+    "event_name": "Zendesk New Ticket",
+    "username": "ZendeskBot",
+    "status": "success"
+})[:-1] + b',"message":'
+TELEX_MESSAGE_TEMPLATE = (
+    "\U0001F3AB **Ticket #{ticket_id}\n"
+    "\U0001F4CC **Subject:** {subject}\n"
+    "\U0001F518 **Status:** {status}\n"
+    "⚡ **Priority:** {priority}\n"
+    "\U0001F464 **Requester:** {requester_email}\n"
+    "\U0001F4AC **Message:** {message}"
+)
+
+# Zendesk's status and priority come from small fixed sets, so pre-fill them
+# into one template per combination and only format the free-text fields per request
+ZENDESK_STATUSES = ("new", "open", "pending", "hold", "solved", "closed", "Unknown")
+ZENDESK_PRIORITIES = ("low", "normal", "high", "urgent", "Unknown", None)
+TELEX_MESSAGE_TEMPLATES = {
+    (status, priority): TELEX_MESSAGE_TEMPLATE.replace("{status}", str(status)).replace("{priority}", str(priority))
+    for status in ZENDESK_STATUSES
+    for priority in ZENDESK_PRIORITIES
+}
+
+# Telex messages are queued and sent in the background after Zendesk has been
+# answered, so the app must run as a long-lived server (gunicorn/uvicorn), not
+# as a serverless function that is frozen once the response is sent
+TELEX_QUEUE_SIZE = 10_000
+# Seconds Zendesk is asked to wait before redelivering when the queue is full
+TELEX_QUEUE_FULL_RETRY_AFTER = 5
+TELEX_SHUTDOWN_TIMEOUT = 5.0
+
+# Messages arriving within a short window are merged into a single Telex post
+TELEX_BATCH_WINDOW = 1.0
+TELEX_BATCH_SIZE = 32
+TELEX_BATCH_SEPARATOR = "\n\n"
+
+# Upper bound on Telex posts in flight; once reached, the queue absorbs the
+# backlog and then rejects new deliveries with 429
+TELEX_MAX_IN_FLIGHT = 32
+
+# Transport errors and transient HTTP statuses from Telex are retried with
+# full-jitter exponential backoff, honouring Retry-After when Telex sends it
+TELEX_MAX_RETRIES = 2
+TELEX_RETRY_BACKOFF = 0.2
+TELEX_RETRY_MAX_DELAY = 5.0
+TELEX_RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Stop accepting deliveries for a while after repeated Telex failures
+TELEX_FAILURE_THRESHOLD = 5
+TELEX_RECOVERY_TIMEOUT = 30.0
+
+# Deliveries seen in the last 10 minutes, so Zendesk retries are not forwarded twice
+recent_deliveries = TTLCache(maxsize=10_000, ttl=600)
+
+# Hash of the last message Telex accepted per ticket id, so updates that would
+# post an identical message are dropped
+last_forwarded = LRUCache(maxsize=4096)
+
+# Hash of the latest message per ticket id that is queued but not yet sent, so
+# identical updates arriving within one batch window are dropped too. Bounded by
+# the queue size plus the batches in flight.
+pending_forwards: dict[str, int] = {}
+
+# Keep logging quiet in production; set LOG_LEVEL=DEBUG to see incoming payloads.
+# Only the names both logging and uvicorn understand are accepted.
+LOG_LEVELS = ("critical", "error", "warning", "info", "debug")
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "warning").strip().lower()
+if LOG_LEVEL not in LOG_LEVELS:
+    raise ValueError(f"LOG_LEVEL must be one of {', '.join(LOG_LEVELS)}, got {LOG_LEVEL!r}")
+logger = logging.getLogger(__name__)
+
+
+# Zendesk webhook payload, parsed straight from the raw body by pydantic-core.
+# Display fields accept any JSON scalar since they are only formatted into text.
+def require_json_scalar(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        raise ValueError("expected a JSON scalar")
+    return value
+
+
+JsonScalar = Annotated[Any, AfterValidator(require_json_scalar)]
+
 
-@app.post("/zendesk-integration")
-async def zendesk_integration(request: Request) -> JSONResponse:
+class Requester(BaseModel):
+    email: JsonScalar = "Unknown"
+
+
+class Comment(BaseModel):
+    body: JsonScalar = None
+
+
+class Ticket(BaseModel):
+    # Keep undeclared fields so a ticket carrying only those still counts as present
+    model_config = ConfigDict(extra="allow")
+
+    id: JsonScalar = "Unknown"
+    subject: JsonScalar = "No Subject"
+    status: JsonScalar = "Unknown"
+    priority: JsonScalar = "Unknown"
+    requester: Requester = Field(default_factory=Requester)
+    latest_comment: Comment = Field(default_factory=Comment)
+    description: JsonScalar = None
+    updated_at: JsonScalar = None
+
+
+class ZendeskWebhook(BaseModel):
+    ticket: Ticket
+
+
+class Delivery(enum.Enum):
+    DELIVERED = "delivered"
+    # Telex refused this payload (non-retryable 4xx); other payloads may still go through
+    REJECTED = "rejected"
+    # Telex was unreachable or kept failing after retries
+    FAILED = "failed"
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failures. Once `recovery_timeout`
+    # has passed it lets calls through again (half-open); a success closes it and
+    # another failure re-opens it straight away.
+    def __init__(self, failure_threshold: int, recovery_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        return self.retry_after > 0
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.basicConfig(level=LOG_LEVEL.upper())
+
+    # Share one pooled HTTP/2 client across requests so connections to Telex are reused
+    app.state.telex_client = httpx.AsyncClient(
+        base_url=TELEX_BASE_URL,
+        headers={
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        },
+        http2=True,
+        follow_redirects=True,
+        timeout=httpx.Timeout(3.0, connect=1.0, pool=1.0),
+        limits=httpx.Limits(max_connections=1000, max_keepalive_connections=100, keepalive_expiry=30.0)
+    )
+    # Open a connection up front so the first webhook does not pay for the handshake
     try:
-        # Parse JSON data
-        data = await request.json()
-        ticket = data.get("ticket", {})
-
-        # Validate required fields
-        if not ticket:
-            return JSONResponse(content={"error": "Missing 'ticket' data in request."}, status_code=400)
-
-        # Extract ticket details
-        ticket_id = str(ticket.get("id", "Unknown"))
-        requester = ticket.get("requester", {})
-        subject = ticket.get("subject", "No Subject")
-        requester_email = requester.get("email", "Unknown")
-        status = ticket.get("status", "Unknown")
-        priority = ticket.get("priority", "Unknown")
-        message = ticket.get("latest_comment", {}).get("body") or ticket.get("description") or "No message provided"
-
-        # Construct payload for Telex
-        telex_payload = {
-            "event_name": "Zendesk New Ticket",
-            "username": "ZendeskBot",
-            "status": "success",
-            "message": (
-                f"\U0001F3AB **Ticket #{ticket_id}\n"
-                f"\U0001F4CC **Subject:** {subject}\n"
-                f"\U0001F518 **Status:** {status}\n"
-                f"⚡ **Priority:** {priority}\n"
-                f"\U0001F464 **Requester:** {requester_email}\n"
-                f"\U0001F4AC **Message:** {message}"
-            )
-        }
-
-        # Send to Telex.im
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                TELEX_WEBHOOK_URL,
-                json=telex_payload,
-                headers={
-                    "Accept": "application/json",
-                    "Content-Type": "application/json"
-                },
-                follow_redirects=True
-            )
+        await app.state.telex_client.head("/")
+    except httpx.HTTPError as e:
+        logger.warning("Could not pre-warm the Telex connection: %s", e)
+    app.state.telex_breaker = CircuitBreaker(TELEX_FAILURE_THRESHOLD, TELEX_RECOVERY_TIMEOUT)
+    app.state.telex_queue = asyncio.Queue(maxsize=TELEX_QUEUE_SIZE)
+    app.state.telex_semaphore = asyncio.Semaphore(TELEX_MAX_IN_FLIGHT)
+    batcher = asyncio.create_task(
+        telex_batcher(
+            app.state.telex_queue,
+            app.state.telex_client,
+            app.state.telex_breaker,
+            app.state.telex_semaphore
+        )
+    )
+    yield
+
+    # Give queued messages a chance to go out before stopping the batcher
+    try:
+        await asyncio.wait_for(app.state.telex_queue.join(), TELEX_SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Dropping %d undelivered Telex messages on shutdown", app.state.telex_queue.qsize())
+    batcher.cancel()
+    await asyncio.gather(batcher, return_exceptions=True)
+    await app.state.telex_client.aclose()
+
+
+async def read_signed_body(request: Request) -> bytearray:
+    # Zendesk signs base64(HMAC-SHA256(secret, timestamp + body)); hash the body as it streams in
+    signature = request.headers.get("X-Zendesk-Webhook-Signature")
+    timestamp = request.headers.get("X-Zendesk-Webhook-Signature-Timestamp")
+    if not signature or not timestamp:
+        raise HTTPException(status_code=401, detail="Invalid Zendesk webhook signature.")
+    try:
+        expected_digest = base64.b64decode(signature, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=401, detail="Invalid Zendesk webhook signature.")
+    if len(expected_digest) != 32:
+        raise HTTPException(status_code=401, detail="Invalid Zendesk webhook signature.")
+
+    mac = hmac.new(_ZENDESK_SECRET_BYTES, timestamp.encode(), "sha256")
+    body = bytearray()
+    async for chunk in request.stream():
+        mac.update(chunk)
+        body += chunk
+
+    if not hmac.compare_digest(mac.digest(), expected_digest):
+        raise HTTPException(status_code=401, detail="Invalid Zendesk webhook signature.")
+    return body
+
+
+def format_telex_message(ticket: Ticket) -> str:
+    message = ticket.latest_comment.body or ticket.description or "No message provided"
+    template = TELEX_MESSAGE_TEMPLATES.get((ticket.status, ticket.priority))
+    if template is None:
+        return TELEX_MESSAGE_TEMPLATE.format(
+            ticket_id=ticket.id,
+            subject=ticket.subject,
+            status=ticket.status,
+            priority=ticket.priority,
+            requester_email=ticket.requester.email,
+            message=message
+        )
+    return template.format(
+        ticket_id=ticket.id,
+        subject=ticket.subject,
+        requester_email=ticket.requester.email,
+        message=message
+    )
+
+
+def build_telex_payload(message: str) -> bytes:
+    return TELEX_PAYLOAD_PREFIX + orjson.dumps(message) + b"}"
+
+
+def telex_retry_delay(attempt: int, response: httpx.Response | None) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), TELEX_RETRY_MAX_DELAY)
+    return random.uniform(0, min(TELEX_RETRY_MAX_DELAY, TELEX_RETRY_BACKOFF * 2 ** attempt))
+
+
+async def forward_to_telex(client: httpx.AsyncClient, breaker: CircuitBreaker, telex_payload: bytes) -> Delivery:
+    # Runs after Zendesk has been answered, so failures can only be logged
+    for attempt in range(TELEX_MAX_RETRIES + 1):
+        response = None
+        try:
+            response = await client.post(TELEX_WEBHOOK_PATH, content=telex_payload)
             response.raise_for_status()
-            return JSONResponse(content={"message": "Sent to Telex"}, status_code=200)
+            breaker.record_success()
+            return Delivery.DELIVERED
+        except httpx.HTTPError as e:
+            retryable = isinstance(e, httpx.TransportError) or (
+                response is not None and response.status_code in TELEX_RETRY_STATUSES
+            )
+            if not retryable:
+                # Payload-specific rejections (e.g. 400, 413) say nothing about Telex's health
+                logger.error("Telex rejected the request: %s", e)
+                return Delivery.REJECTED
+            if attempt == TELEX_MAX_RETRIES:
+                logger.error("Failed to send request to Telex: %s", e)
+                breaker.record_failure()
+                return Delivery.FAILED
+            await asyncio.sleep(telex_retry_delay(attempt, response))
+
+
+async def send_telex_batch(
+    queue: asyncio.Queue,
+    client: httpx.AsyncClient,
+    breaker: CircuitBreaker,
+    semaphore: asyncio.Semaphore,
+    batch: list[tuple[str | None, int, str]]
+) -> None:
+    try:
+        telex_payload = build_telex_payload(TELEX_BATCH_SEPARATOR.join(message for _, _, message in batch))
+        delivery = await forward_to_telex(client, breaker, telex_payload)
+        if delivery is Delivery.DELIVERED:
+            delivered = batch
+        elif delivery is Delivery.REJECTED and len(batch) > 1:
+            # The merged post may have been refused for its size or for one bad
+            # message, so send the messages one at a time instead of dropping them all
+            logger.warning("Telex rejected a batch of %d messages; sending them individually", len(batch))
+            delivered = [
+                item for item in batch
+                if await forward_to_telex(client, breaker, build_telex_payload(item[2])) is Delivery.DELIVERED
+            ]
+        else:
+            delivered = []
+
+        for ticket_key, message_hash, _ in delivered:
+            if ticket_key is not None:
+                last_forwarded[ticket_key] = message_hash
+    except Exception:
+        logger.exception("Unexpected error while sending to Telex")
+    finally:
+        semaphore.release()
+        for ticket_key, message_hash, _ in batch:
+            # Leave the entry alone if a newer message for the ticket has been queued since
+            if ticket_key is not None and pending_forwards.get(ticket_key) == message_hash:
+                del pending_forwards[ticket_key]
+            queue.task_done()
+
+
+def drain_queue(queue: asyncio.Queue, batch: list) -> None:
+    while len(batch) < TELEX_BATCH_SIZE:
+        try:
+            batch.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            return
+
+
+async def telex_batcher(
+    queue: asyncio.Queue,
+    client: httpx.AsyncClient,
+    breaker: CircuitBreaker,
+    semaphore: asyncio.Semaphore
+) -> None:
+    sending: set[asyncio.Task] = set()
+    try:
+        while True:
+            batch = [await queue.get()]
+            drain_queue(queue, batch)
+            # Wait for more messages unless the batch is already full, and hold
+            # queued messages until Telex may have recovered
+            if len(batch) < TELEX_BATCH_SIZE or breaker.is_open:
+                await asyncio.sleep(max(TELEX_BATCH_WINDOW, breaker.retry_after))
+                drain_queue(queue, batch)
+
+            # Released by send_telex_batch once the post has finished
+            await semaphore.acquire()
+            task = asyncio.create_task(send_telex_batch(queue, client, breaker, semaphore, batch))
+            sending.add(task)
+            task.add_done_callback(sending.discard)
+    finally:
+        for task in sending:
+            task.cancel()
+
+
+# Initialize FastAPI
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+# Starlette still re-raises the error after this responds, so the server logs the traceback
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception) -> ORJSONResponse:
+    return ORJSONResponse(content={"detail": "Internal server error."}, status_code=500)
+
+
+@app.post("/zendesk-integration", status_code=202, response_class=ORJSONResponse)
+async def zendesk_integration(request: Request) -> dict:
+    # Fail fast while Telex is unhealthy so Zendesk retries the delivery later
+    breaker = request.app.state.telex_breaker
+    if breaker.is_open:
+        raise HTTPException(
+            status_code=503,
+            detail="Telex is currently unavailable, retry later.",
+            headers={"Retry-After": str(math.ceil(breaker.retry_after))}
+        )
+
+    # Verify the webhook signature when a signing secret is configured
+    if _ZENDESK_SECRET_BYTES is not None:
+        body = await read_signed_body(request)
+    else:
+        body = await request.body()
+
+    # Parse and validate the payload straight from the raw body
+    try:
+        webhook = ZendeskWebhook.model_validate_json(body)
+    except ValidationError as e:
+        error = e.errors()[0]
+        if error["type"] == "json_invalid":
+            raise HTTPException(status_code=400, detail="Invalid JSON in request body.")
+        if len(error["loc"]) <= 1:
+            raise HTTPException(status_code=400, detail="Missing 'ticket' data in request.")
+        field = ".".join(str(part) for part in error["loc"][1:])
+        raise HTTPException(status_code=400, detail=f"Invalid ticket field '{field}' in request.")
+    logger.debug("Incoming Zendesk data: %s", webhook)
+    ticket = webhook.ticket
+
+    # Validate required fields
+    if not ticket.model_fields_set and not ticket.model_extra:
+        raise HTTPException(status_code=400, detail="Missing 'ticket' data in request.")
+
+    # Skip deliveries already forwarded; the check and insert never yield to the event loop
+    delivery_id = request.headers.get("X-Zendesk-Webhook-Invocation-Id")
+    if not delivery_id and ticket.updated_at:
+        delivery_id = f"{ticket.id}:{ticket.updated_at}"
+    if delivery_id:
+        if delivery_id in recent_deliveries:
+            return {"message": "Duplicate delivery ignored"}
+        recent_deliveries[delivery_id] = True
+
+    # Construct the Telex message, skipping it if it repeats the ticket's last one
+    telex_message = format_telex_message(ticket)
+    ticket_key = str(ticket.id) if "id" in ticket.model_fields_set else None
+    message_hash = hash(telex_message)
+    if ticket_key is not None and message_hash in (
+        last_forwarded.get(ticket_key),
+        pending_forwards.get(ticket_key)
+    ):
+        return {"message": "Duplicate delivery ignored"}
+
+    # Acknowledge Zendesk right away and let the batcher send to Telex.im
+    try:
+        request.app.state.telex_queue.put_nowait((ticket_key, message_hash, telex_message))
+    except asyncio.QueueFull:
+        # Forget the delivery so Zendesk's retry is not dropped as a duplicate
+        if delivery_id:
+            recent_deliveries.pop(delivery_id, None)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many pending Telex deliveries, retry later.",
+            headers={"Retry-After": str(TELEX_QUEUE_FULL_RETRY_AFTER)}
+        )
+    if ticket_key is not None:
+        pending_forwards[ticket_key] = message_hash
+    return {"message": "Queued for Telex"}
+
+
+if __name__ == "__main__":
+    import uvicorn
 
-    except httpx.RequestError:
-        return JSONResponse(content={"error": "Failed to send request to Telex"}, status_code=500)
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+    # uvloop is not available on Windows, so fall back to the stock loop there
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="asyncio" if os.name == "nt" else "uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+        log_level=LOG_LEVEL
+    )
@@ -0,0 +1,52 @@
+import functools
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+class FakeTelex:
+    # Stands in for ping.telex.im: records every request and answers with `status`,
+    # unless a test swaps in its own `respond`
+    def __init__(self):
+        self.status = 200
+        self.requests: list[httpx.Request] = []
+        self.respond = self.respond_with_status
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        return self.respond(request)
+
+    def respond_with_status(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.status)
+
+    @property
+    def posts(self) -> list[httpx.Request]:
+        return [request for request in self.requests if request.method == "POST"]
+
+
+@pytest.fixture
+def telex(monkeypatch):
+    fake = FakeTelex()
+    # Keep the lifespan's Telex client (and its pre-warm request) off the network
+    transport = httpx.MockTransport(fake)
+    monkeypatch.setattr(httpx, "AsyncClient", functools.partial(httpx.AsyncClient, transport=transport))
+    return fake
+
+
+@pytest.fixture
+def client(telex, monkeypatch):
+    monkeypatch.setattr(main, "TELEX_BATCH_WINDOW", 0.01)
+    monkeypatch.setattr(main, "recent_deliveries", main.TTLCache(maxsize=10, ttl=600))
+    monkeypatch.setattr(main, "last_forwarded", main.LRUCache(maxsize=10))
+    monkeypatch.setattr(main, "pending_forwards", {})
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def wait_for_telex(client):
+    # Blocks until everything queued so far has been sent (or given up on)
+    return lambda: client.portal.call(main.app.state.telex_queue.join)
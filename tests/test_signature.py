@@ -0,0 +1,61 @@
+import base64
+import hashlib
+import hmac
+
+import pytest
+
+import main
+
+SECRET = b"test-signing-secret"
+TIMESTAMP = "2025-01-01T00:00:00Z"
+BODY = b'{"ticket": {"id": 1, "subject": "Printer on fire"}}'
+
+
+def sign(body: bytes, timestamp: str = TIMESTAMP, secret: bytes = SECRET) -> str:
+    digest = hmac.new(secret, timestamp.encode() + body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode()
+
+
+@pytest.fixture(autouse=True)
+def signing_secret(monkeypatch):
+    monkeypatch.setattr(main, "_ZENDESK_SECRET_BYTES", SECRET)
+
+
+def post(client, headers):
+    return client.post("/zendesk-integration", content=BODY, headers=headers)
+
+
+def test_valid_signature_is_accepted(client):
+    response = post(client, {
+        "X-Zendesk-Webhook-Signature": sign(BODY),
+        "X-Zendesk-Webhook-Signature-Timestamp": TIMESTAMP,
+    })
+
+    assert response.status_code == 202
+    assert response.json() == {"message": "Queued for Telex"}
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-Zendesk-Webhook-Signature-Timestamp": TIMESTAMP},
+    {"X-Zendesk-Webhook-Signature": sign(BODY)},
+], ids=["no-headers", "no-signature", "no-timestamp"])
+def test_missing_signature_headers_are_rejected(client, headers):
+    assert post(client, headers).status_code == 401
+
+
+@pytest.mark.parametrize("signature", [
+    "not base64!",
+    base64.b64encode(b"\x00" * 31).decode(),
+    sign(BODY, secret=b"wrong-secret"),
+    sign(BODY, timestamp="2024-12-31T23:59:59Z"),
+    sign(BODY + b" "),
+], ids=["non-base64", "wrong-length", "wrong-secret", "wrong-timestamp", "tampered-body"])
+def test_invalid_signature_is_rejected(client, signature):
+    response = post(client, {
+        "X-Zendesk-Webhook-Signature": signature,
+        "X-Zendesk-Webhook-Signature-Timestamp": TIMESTAMP,
+    })
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid Zendesk webhook signature."}
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+
+
+def new_breaker():
+    return main.CircuitBreaker(main.TELEX_FAILURE_THRESHOLD, main.TELEX_RECOVERY_TIMEOUT)
+
+
+@pytest.fixture
+def forward(monkeypatch):
+    # Posts one payload through forward_to_telex without backoff, answering each
+    # attempt with the next entry of `responses` (a status code or an exception
+    # to raise); returns the outcome and the number of attempts
+    monkeypatch.setattr(main, "telex_retry_delay", lambda attempt, response: 0)
+
+    def forward(responses, breaker=None):
+        attempts = []
+
+        def handler(request):
+            outcome = responses[len(attempts)]
+            attempts.append(request)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return httpx.Response(outcome)
+
+        async def run():
+            transport = httpx.MockTransport(handler)
+            async with httpx.AsyncClient(base_url=main.TELEX_BASE_URL, transport=transport) as client:
+                return await main.forward_to_telex(client, breaker or new_breaker(), b"{}")
+
+        return asyncio.run(run()), len(attempts)
+
+    return forward
+
+
+@pytest.mark.parametrize("transient", [500, 503, 429, httpx.ConnectError("refused")])
+def test_transient_failures_are_retried(forward, transient):
+    assert forward([transient, transient, 200]) == (main.Delivery.DELIVERED, 3)
+
+
+def test_retries_stop_after_the_limit(forward):
+    attempts = main.TELEX_MAX_RETRIES + 1
+    assert forward([502] * attempts) == (main.Delivery.FAILED, attempts)
+
+
+@pytest.mark.parametrize("status", [400, 404, 413])
+def test_other_client_errors_are_not_retried(forward, status):
+    assert forward([status, 200]) == (main.Delivery.REJECTED, 1)
+
+
+@pytest.mark.parametrize(("retry_after", "expected"), [("2", 2.0), ("0", 0.0), ("99", main.TELEX_RETRY_MAX_DELAY)])
+def test_retry_after_takes_precedence_and_is_capped(retry_after, expected):
+    response = httpx.Response(503, headers={"Retry-After": retry_after})
+    assert main.telex_retry_delay(3, response) == expected
+
+
+def test_backoff_uses_capped_full_jitter(monkeypatch):
+    monkeypatch.setattr(main.random, "uniform", lambda low, high: (low, high))
+
+    assert main.telex_retry_delay(0, None) == (0, main.TELEX_RETRY_BACKOFF)
+    assert main.telex_retry_delay(2, httpx.Response(503)) == (0, main.TELEX_RETRY_BACKOFF * 4)
+    assert main.telex_retry_delay(10, None) == (0, main.TELEX_RETRY_MAX_DELAY)
+
+
+def test_breaker_opens_after_consecutive_exhausted_failures(forward):
+    breaker = new_breaker()
+    exhausted = [503] * (main.TELEX_MAX_RETRIES + 1)
+
+    for _ in range(main.TELEX_FAILURE_THRESHOLD - 1):
+        forward(exhausted, breaker)
+    assert not breaker.is_open
+
+    forward(exhausted, breaker)
+    assert breaker.is_open
+
+
+def test_breaker_ignores_rejected_payloads(forward):
+    breaker = new_breaker()
+
+    for _ in range(main.TELEX_FAILURE_THRESHOLD):
+        forward([400], breaker)
+
+    assert breaker.failures == 0
+    assert not breaker.is_open
+
+
+def test_half_open_breaker_closes_on_success(forward):
+    breaker = new_breaker()
+    for _ in range(main.TELEX_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - main.TELEX_RECOVERY_TIMEOUT
+
+    assert not breaker.is_open
+    assert forward([200], breaker) == (main.Delivery.DELIVERED, 1)
+    assert breaker.failures == 0
+    assert breaker.opened_at is None
+
+
+def test_half_open_breaker_reopens_on_failure():
+    breaker = new_breaker()
+    for _ in range(main.TELEX_FAILURE_THRESHOLD):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - main.TELEX_RECOVERY_TIMEOUT
+
+    breaker.record_failure()
+
+    assert breaker.is_open
+
+
+def test_open_breaker_makes_the_route_return_503(client, telex):
+    breaker = main.app.state.telex_breaker
+    for _ in range(main.TELEX_FAILURE_THRESHOLD):
+        breaker.record_failure()
+
+    response = client.post("/zendesk-integration", json={"ticket": {"id": 1}})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(int(main.TELEX_RECOVERY_TIMEOUT))
+    assert not telex.posts
@@ -0,0 +1,24 @@
+import orjson
+import pytest
+
+from main import build_telex_payload
+
+
+@pytest.mark.parametrize("message", [
+    "",
+    "plain text",
+    'say "hello"',
+    "back\\slash and \\n literal",
+    "line\nbreak\ttab\rreturn",
+    "\x00\x01\x1f control characters",
+    "\u2028\u2029 line separators",
+    "🎫 emoji and non-BMP 𝄞 text",
+    '"}, "injected": {"',
+])
+def test_build_telex_payload_round_trips_message(message):
+    payload = orjson.loads(build_telex_payload(message))
+
+    assert payload["message"] == message
+    assert payload["event_name"] == "Zendesk New Ticket"
+    assert payload["username"] == "ZendeskBot"
+    assert payload["status"] == "success"
@@ -0,0 +1,77 @@
+import httpx
+import orjson
+import pytest
+
+import main
+
+
+def post_ticket(client, ticket):
+    return client.post("/zendesk-integration", json={"ticket": ticket})
+
+
+def test_ticket_with_only_undeclared_fields_is_forwarded(client, telex, wait_for_telex):
+    response = post_ticket(client, {"foo": 1})
+    wait_for_telex()
+
+    assert response.status_code == 202
+    message = orjson.loads(telex.posts[0].content)["message"]
+    assert "**Subject:** No Subject" in message
+
+
+@pytest.mark.parametrize("body", [{}, {"ticket": None}, {"ticket": {}}])
+def test_missing_or_empty_ticket_is_rejected(client, body):
+    response = client.post("/zendesk-integration", json=body)
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Missing 'ticket' data in request."}
+
+
+def test_identical_updates_within_one_batch_are_sent_once(client, telex, wait_for_telex, monkeypatch):
+    monkeypatch.setattr(main, "TELEX_BATCH_WINDOW", 0.2)
+    ticket = {"id": 7, "status": "open", "subject": "Printer on fire"}
+
+    first = post_ticket(client, ticket)
+    second = post_ticket(client, {**ticket, "id": "7"})
+    wait_for_telex()
+
+    assert first.json() == {"message": "Queued for Telex"}
+    assert second.json() == {"message": "Duplicate delivery ignored"}
+    assert len(telex.posts) == 1
+    assert orjson.loads(telex.posts[0].content)["message"].count("Ticket #7") == 1
+
+
+def test_identical_update_is_resent_after_a_failed_delivery(client, telex, wait_for_telex):
+    ticket = {"id": 7, "status": "open"}
+
+    telex.status = 400
+    post_ticket(client, ticket)
+    wait_for_telex()
+    telex.status = 200
+    response = post_ticket(client, ticket)
+    wait_for_telex()
+
+    assert response.json() == {"message": "Queued for Telex"}
+    assert len(telex.posts) == 2
+    assert "7" in main.last_forwarded
+    assert main.pending_forwards == {}
+
+
+def test_rejected_batch_falls_back_to_individual_posts(client, telex, wait_for_telex, monkeypatch):
+    monkeypatch.setattr(main, "TELEX_BATCH_WINDOW", 0.2)
+
+    def reject_merged_posts(request):
+        telex.requests.append(request)
+        message = orjson.loads(request.content)["message"]
+        status = 413 if message.count("Ticket #") > 1 else 400 if "Ticket #2" in message else 200
+        return httpx.Response(status)
+
+    telex.respond = reject_merged_posts
+    for ticket_id in (1, 2, 3):
+        post_ticket(client, {"id": ticket_id})
+    wait_for_telex()
+
+    sent = [orjson.loads(request.content)["message"] for request in telex.posts]
+    assert len(sent) == 4
+    assert sent[0].count("Ticket #") == 3
+    assert set(main.last_forwarded) == {"1", "3"}
+    assert not main.app.state.telex_breaker.failures